@@ -0,0 +1,192 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Optional, Tuple
+
+try:
+    import redis
+except ImportError:  # Redis is optional; the in-process cache works without it
+    redis = None
+
+
+class _LocalLRU:
+    """
+    Thread-safe in-process LRU whose entries also expire after `ttl` seconds.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class DiscountCache:
+    """
+    Cache for GET /highest-discount results.
+
+    Results are always kept in a small in-process LRU. When a Redis client is
+    given, they are also shared across workers through Redis.
+
+    Every key embeds a version number which is bumped when offers change, so
+    invalidation is a single INCR instead of a scan over old keys.
+
+    Without Redis the version is per process, so another worker's
+    invalidate() is never seen; in-process entries therefore expire after
+    `local_ttl` seconds, which bounds how stale a multi-worker setup can be.
+    """
+
+    KEY_PREFIX = "hd"
+    VERSION_KEY = "hd:version"
+
+    def __init__(self, maxsize: int = 4096, redis_client=None, ttl: int = 3600, local_ttl: float = 30):
+        self.redis = redis_client
+        self.ttl = ttl
+        self._local = _LocalLRU(maxsize, local_ttl)
+        self._local_version = 0
+        self._lock = Lock()
+
+    @classmethod
+    def from_env(cls) -> "DiscountCache":
+        """
+        Build the cache, connecting to Redis if REDIS_URL is set and the
+        `redis` package is installed.
+        """
+        redis_url = os.getenv("REDIS_URL")
+        redis_client = redis.Redis.from_url(redis_url) if redis_url and redis else None
+        return cls(redis_client=redis_client)
+
+    def version(self) -> int:
+        """
+        Current offers version; changes every time invalidate() is called.
+        """
+        if self.redis is not None:
+            try:
+                return int(self.redis.get(self.VERSION_KEY) or 0)
+            except Exception as e:
+                print(f"Error reading cache version from Redis: {e}")
+        return self._local_version
+
+    def _key(self, version: int, bank_name: str, payment_instrument: Optional[str], amount: float) -> str:
+        return f"{self.KEY_PREFIX}:{version}:{bank_name}:{payment_instrument or '*'}:{amount!r}"
+
+    def get(self, version: int, bank_name: str, payment_instrument: Optional[str], amount: float) -> Optional[float]:
+        """
+        Return the cached highest discount at `version`, or None on a miss.
+
+        Read the version once per request (with version()) and pass the same
+        value to set(), so a result computed from offers read before an
+        invalidate() can't be stored under the newer version.
+        """
+        key = self._key(version, bank_name, payment_instrument, amount)
+
+        value = self._local.get(key)
+        if value is not None:
+            return value
+
+        if self.redis is not None:
+            try:
+                value = self.redis.get(key)
+            except Exception as e:
+                print(f"Error reading from Redis cache: {e}")
+                return None
+            if value is not None:
+                value = float(value)
+                self._local.set(key, value)
+                return value
+
+        return None
+
+    def set(self, version: int, bank_name: str, payment_instrument: Optional[str], amount: float, value: float) -> None:
+        """
+        Cache the highest discount for the given query at `version` (the
+        value get() was called with).
+        """
+        key = self._key(version, bank_name, payment_instrument, amount)
+        self._local.set(key, value)
+
+        if self.redis is not None:
+            try:
+                self.redis.set(key, value, ex=self.ttl)
+            except Exception as e:
+                print(f"Error writing to Redis cache: {e}")
+
+    def invalidate(self) -> None:
+        """
+        Drop all cached results (call whenever offers are added or removed).
+        """
+        with self._lock:
+            self._local_version += 1
+        self._local.clear()
+
+        if self.redis is not None:
+            try:
+                self.redis.incr(self.VERSION_KEY)
+            except Exception as e:
+                print(f"Error invalidating Redis cache: {e}")
+
+
+class OffersPageCache:
+    """
+    In-process cache of serialized GET /offers pages.
+
+    Pages are keyed by the DiscountCache version, so the same invalidate()
+    call that drops cached discounts also retires every cached page. Like
+    DiscountCache's in-process entries, pages expire after `ttl` seconds.
+
+    The ETag is a hash of the page body rather than of the version: the
+    version is a per-process counter without Redis, so a version-based tag
+    would repeat across restarts and workers while the data differed.
+    """
+
+    def __init__(self, maxsize: int = 64, ttl: float = 30):
+        self._pages = _LocalLRU(maxsize, ttl)
+
+    @staticmethod
+    def etag_for(body: bytes) -> str:
+        """
+        Strong ETag for a response body.
+        """
+        return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+    def get(self, version: int, skip: int, limit: int) -> Optional[Tuple[bytes, str]]:
+        """
+        Return the cached (body, etag) for a page at `version`, or None on a miss.
+        """
+        return self._pages.get(f"{version}:{skip}:{limit}")
+
+    def set(self, version: int, skip: int, limit: int, body: bytes) -> Tuple[bytes, str]:
+        """
+        Cache a serialized page at `version`; returns (body, etag).
+        """
+        page = (body, self.etag_for(body))
+        self._pages.set(f"{version}:{skip}:{limit}", page)
+        return page
+
+
+discount_cache = DiscountCache.from_env()
+offers_page_cache = OffersPageCache()
@@ -1,159 +1,278 @@
-from sqlalchemy.orm import Session
-from typing import List, Optional, Tuple
+from sqlalchemy import and_, case, delete, func, insert, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, selectinload
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 from app import models, schemas
+from app.utils import parse_discount_terms
 
+# Maximum number of values bound into a single IN (...) clause
+IN_CLAUSE_CHUNK_SIZE = 10000
 
-def get_or_create_bank(db: Session, bank_code: str, commit: bool = False) -> models.Bank:
+# Number of offers written per bulk INSERT in create_offers_batch
+OFFER_CHUNK_SIZE = 500
+
+
+def _supports_on_conflict(db: Session) -> bool:
     """
-    Get existing bank or create new one.
+    Whether the database supports INSERT ... ON CONFLICT DO NOTHING.
     """
-    bank = db.query(models.Bank).filter(models.Bank.bank_code == bank_code).first()
-    if not bank:
-        bank = models.Bank(bank_code=bank_code)
-        db.add(bank)
-        if commit:
-            db.commit()
-            db.refresh(bank)
-    return bank
+    return db.get_bind().dialect.name in ('postgresql', 'sqlite')
 
 
-def get_or_create_payment_instrument(db: Session, instrument_type: str, commit: bool = False) -> models.PaymentInstrument:
+def _insert_ignoring_conflicts(db: Session, table):
     """
-    Get existing payment instrument or create new one.
+    Build an INSERT for `table` (a Table or mapped class) that silently
+    skips rows violating a unique/primary key constraint (ON CONFLICT DO
+    NOTHING) where the database supports it.
+    """
+    dialect_name = db.get_bind().dialect.name
+    if dialect_name == 'postgresql':
+        return postgresql.insert(table).on_conflict_do_nothing()
+    if dialect_name == 'sqlite':
+        return sqlite.insert(table).on_conflict_do_nothing()
+    return insert(table)
+
+
+def _get_or_create_many(db: Session, model, key_column, keys: Iterable[str]) -> Dict[str, object]:
+    """
+    Get or create rows of `model` for every distinct key, in one SELECT
+    plus at most one bulk INSERT.
+    
+    Returns:
+        Dict mapping key -> model instance
+    """
+    unique_keys = list(dict.fromkeys(key for key in keys if key))
+    if not unique_keys:
+        return {}
+    
+    existing = db.scalars(select(model).where(key_column.in_(unique_keys))).all()
+    by_key = {getattr(row, key_column.key): row for row in existing}
+    
+    missing = [key for key in unique_keys if key not in by_key]
+    if missing:
+        created = db.scalars(
+            insert(model).returning(model),
+            [{key_column.key: key} for key in missing]
+        ).all()
+        by_key.update((getattr(row, key_column.key), row) for row in created)
+    
+    return by_key
+
+
+def get_or_create_banks(db: Session, bank_codes: Iterable[str]) -> Dict[str, models.Bank]:
     """
-    instrument = db.query(models.PaymentInstrument).filter(
-        models.PaymentInstrument.instrument_type == instrument_type
-    ).first()
+    Get or create all given banks at once.
     
-    if not instrument:
-        instrument = models.PaymentInstrument(instrument_type=instrument_type)
-        db.add(instrument)
-        if commit:
-            db.commit()
-            db.refresh(instrument)
+    Returns:
+        Dict mapping bank_code -> Bank
+    """
+    return _get_or_create_many(db, models.Bank, models.Bank.bank_code, bank_codes)
+
+
+def get_or_create_payment_instruments(
+    db: Session,
+    instrument_types: Iterable[str]
+) -> Dict[str, models.PaymentInstrument]:
+    """
+    Get or create all given payment instruments at once.
     
-    return instrument
+    Returns:
+        Dict mapping instrument_type -> PaymentInstrument
+    """
+    return _get_or_create_many(
+        db, models.PaymentInstrument, models.PaymentInstrument.instrument_type, instrument_types
+    )
 
 
-def get_offer_by_offer_id(db: Session, offer_id: str) -> Optional[models.Offer]:
+def get_existing_offer_ids(db: Session, offer_ids: List[str]) -> Set[str]:
     """
-    Get offer by Flipkart's offer_id.
+    Get the subset of given Flipkart offer_ids that are already stored.
+    
+    IDs are queried in chunks of IN_CLAUSE_CHUNK_SIZE to stay under the
+    database's bound-parameter limit on large batches.
     """
-    return db.query(models.Offer).filter(models.Offer.offer_id == offer_id).first()
+    unique_ids = list(dict.fromkeys(offer_ids))
+    existing_ids = set()
+    
+    for start in range(0, len(unique_ids), IN_CLAUSE_CHUNK_SIZE):
+        chunk = unique_ids[start:start + IN_CLAUSE_CHUNK_SIZE]
+        existing_ids.update(db.scalars(
+            select(models.Offer.offer_id).where(models.Offer.offer_id.in_(chunk))
+        ))
+    
+    return existing_ids
 
 
-def create_offer(db: Session, offer_data: dict) -> models.Offer:
+def _insert_new_offers(db: Session, offers_data: List[dict], seen_ids: Set[str]) -> int:
     """
-    Create a new offer with associated banks and payment instruments.
+    Insert the offers from one chunk that aren't stored yet, along with
+    their bank/payment instrument links, using bulk statements.
     
     Args:
-        offer_data: Dict with keys:
-            - offer_id: str
-            - offer_text: str
-            - offer_description: str
-            - logo: str
-            - bank_codes: List[str]
-            - payment_instruments: List[str]
+        seen_ids: offer_ids already handled earlier in the batch (updated in place)
     
     Returns:
-        Created Offer model instance
-    """
-    # Create the offer
-    offer = models.Offer(
-        offer_id=offer_data['offer_id'],
-        offer_text=offer_data['offer_text'],
-        offer_description=offer_data['offer_description'],
-        logo=offer_data.get('logo', '')
+        Number of offers inserted
+    """
+    if not _supports_on_conflict(db):
+        # Without ON CONFLICT, already-stored offers must be filtered out first
+        seen_ids |= get_existing_offer_ids(db, [o['offer_id'] for o in offers_data])
+    
+    candidate_offers = []
+    for offer_data in offers_data:
+        if offer_data['offer_id'] in seen_ids:
+            continue
+        
+        candidate_offers.append(offer_data)
+        seen_ids.add(offer_data['offer_id'])  # Skip repeats within the same batch
+    
+    if not candidate_offers:
+        return 0
+    
+    # Insert all offer rows in one statement, getting their primary keys back.
+    # Offers that are already stored are skipped by ON CONFLICT DO NOTHING and
+    # aren't returned, so no separate existence check is needed.
+    offer_rows = [
+        {
+            'offer_id': o['offer_id'],
+            'offer_text': o['offer_text'],
+            'offer_description': o['offer_description'],
+            'logo': o.get('logo', ''),
+            **parse_discount_terms(o['offer_text'], o['offer_description'])._asdict()
+        }
+        for o in candidate_offers
+    ]
+    result = db.execute(
+        _insert_ignoring_conflicts(db, models.Offer).returning(models.Offer.offer_id, models.Offer.id),
+        offer_rows
     )
+    id_by_offer_id = dict(result.all())
+    new_offers = [o for o in candidate_offers if o['offer_id'] in id_by_offer_id]
     
-    db.add(offer)
-    db.flush()  # Flush to get offer ID
+    if not new_offers:
+        return 0
     
-    # Add banks (get or create without committing)
-    for bank_code in offer_data.get('bank_codes', []):
-        bank = get_or_create_bank(db, bank_code, commit=False)
-        if bank not in offer.banks:
-            offer.banks.append(bank)
+    # Resolve every bank and payment instrument referenced by the new offers at once
+    bank_map = get_or_create_banks(
+        db, (code for o in new_offers for code in o.get('bank_codes', []))
+    )
+    instrument_map = get_or_create_payment_instruments(
+        db, (it for o in new_offers for it in o.get('payment_instruments', []))
+    )
     
-    # Add payment instruments (get or create without committing)
-    for instrument_type in offer_data.get('payment_instruments', []):
-        instrument = get_or_create_payment_instrument(db, instrument_type, commit=False)
-        if instrument not in offer.payment_instruments:
-            offer.payment_instruments.append(instrument)
+    # One INSERT per association table for the whole chunk
+    bank_rows = [
+        {'offer_id': id_by_offer_id[o['offer_id']], 'bank_id': bank_map[code].id}
+        for o in new_offers
+        for code in dict.fromkeys(o.get('bank_codes', []))
+    ]
+    if bank_rows:
+        db.execute(_insert_ignoring_conflicts(db, models.offer_bank_association), bank_rows)
     
-    return offer
+    instrument_rows = [
+        {'offer_id': id_by_offer_id[o['offer_id']], 'payment_instrument_id': instrument_map[it].id}
+        for o in new_offers
+        for it in dict.fromkeys(o.get('payment_instruments', []))
+    ]
+    if instrument_rows:
+        db.execute(
+            _insert_ignoring_conflicts(db, models.offer_payment_instrument_association),
+            instrument_rows
+        )
+    
+    return len(new_offers)
 
 
 def create_offers_batch(db: Session, offers_data: List[dict]) -> Tuple[int, int]:
     """
     Create multiple offers in batch.
     
+    Offers are written in chunks of OFFER_CHUNK_SIZE so the rows built for
+    each bulk statement stay bounded on very large payloads. Everything is
+    committed together at the end.
+    
     Returns:
         Tuple of (total_offers_identified, new_offers_created)
     """
     total_identified = len(offers_data)
     new_created = 0
+    seen_ids = set()
     
-    for offer_data in offers_data:
-        # Check if offer already exists
-        existing_offer = get_offer_by_offer_id(db, offer_data['offer_id'])
-        
-        if not existing_offer:
-            create_offer(db, offer_data)
-            new_created += 1
+    for start in range(0, len(offers_data), OFFER_CHUNK_SIZE):
+        chunk = offers_data[start:start + OFFER_CHUNK_SIZE]
+        new_created += _insert_new_offers(db, chunk, seen_ids)
     
     db.commit()
     
     return total_identified, new_created
 
 
-def get_offers_by_bank(db: Session, bank_name: str) -> List[models.Offer]:
+def _discount_expression(amount_to_pay: float):
     """
-    Get all offers that support a specific bank.
-    
-    Args:
-        bank_name: Bank code (e.g., "AXIS", "HDFC")
-    
-    Returns:
-        List of Offer models
+    SQL equivalent of utils.apply_discount_terms over the stored Offer terms,
+    for offers whose minimum order value is met (see get_highest_discount).
     """
-    return db.query(models.Offer).join(
-        models.Offer.banks
-    ).filter(
-        models.Bank.bank_code == bank_name
-    ).all()
+    pct_amount = models.Offer.pct_discount / 100 * amount_to_pay
+    capped_pct_amount = case(
+        (and_(models.Offer.pct_cap.isnot(None), models.Offer.pct_cap < pct_amount), models.Offer.pct_cap),
+        else_=pct_amount
+    )
+    return case(
+        (models.Offer.pct_discount.isnot(None), capped_pct_amount),
+        else_=func.coalesce(models.Offer.flat_discount, 0.0)
+    )
 
 
-def get_offers_by_bank_and_instrument(
-    db: Session, 
-    bank_name: str, 
-    payment_instrument: str
-) -> List[models.Offer]:
+def get_highest_discount(
+    db: Session,
+    bank_name: str,
+    amount_to_pay: float,
+    payment_instrument: Optional[str] = None
+) -> float:
     """
-    Get all offers that support a specific bank and payment instrument.
+    Get the highest discount among offers for a bank (and optionally a
+    payment instrument), computed in a single aggregate query.
     
     Args:
         bank_name: Bank code (e.g., "AXIS", "HDFC")
+        amount_to_pay: Total amount to pay in rupees
         payment_instrument: Payment instrument type (e.g., "CREDIT", "EMI_OPTIONS")
     
     Returns:
-        List of Offer models
+        Highest discount amount (0.0 if no offer applies)
     """
-    return db.query(models.Offer).join(
+    query = select(
+        func.max(_discount_expression(amount_to_pay))
+    ).select_from(models.Offer).join(
         models.Offer.banks
-    ).join(
-        models.Offer.payment_instruments
-    ).filter(
+    ).where(
         models.Bank.bank_code == bank_name,
-        models.PaymentInstrument.instrument_type == payment_instrument
-    ).all()
+        # Offers below their minimum order value are filtered out, not scored as 0
+        or_(models.Offer.min_order.is_(None), models.Offer.min_order <= amount_to_pay)
+    )
+    
+    if payment_instrument:
+        query = query.join(
+            models.Offer.payment_instruments
+        ).where(
+            models.PaymentInstrument.instrument_type == payment_instrument
+        )
+    
+    return db.scalar(query) or 0.0
 
 
 def get_all_offers(db: Session, skip: int = 0, limit: int = 100) -> List[models.Offer]:
     """
     Get all offers with pagination.
+    Banks and payment instruments are eager-loaded (one extra query each)
+    so iterating them doesn't lazy-load per offer.
     """
-    return db.query(models.Offer).offset(skip).limit(limit).all()
+    return db.scalars(
+        select(models.Offer).options(
+            selectinload(models.Offer.banks),
+            selectinload(models.Offer.payment_instruments)
+        ).offset(skip).limit(limit)
+    ).all()
 
 
 def delete_all_offers(db: Session) -> int:
@@ -161,7 +280,7 @@ def delete_all_offers(db: Session) -> int:
     Delete all offers (useful for testing/reset).
     Returns number of deleted offers.
     """
-    count = db.query(models.Offer).count()
-    db.query(models.Offer).delete()
+    count = db.scalar(select(func.count()).select_from(models.Offer))
+    db.execute(delete(models.Offer))
     db.commit()
     return count
\ No newline at end of file
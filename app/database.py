@@ -1,15 +1,39 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 # SQLite database URL
 SQLALCHEMY_DATABASE_URL = "sqlite:///./piepay.db"
 
 # Create engine
+# Pool sized for FastAPI's threadpool (40 workers by default) so concurrent
+# requests don't hit "QueuePool limit reached" with the default 5 + 10
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, 
-    connect_args={"check_same_thread": False}  # Needed for SQLite
+    connect_args={"check_same_thread": False},  # Needed for SQLite
+    pool_size=20,
+    max_overflow=40,
+    pool_pre_ping=True,  # Replace connections that died while idle
+    pool_recycle=3600,  # Recycle connections after an hour
+    query_cache_size=1200  # Keep compiled statements reused across ingest chunks cached
 )
 
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Tune each new SQLite connection: WAL journaling so commits are appends
+    instead of rollback-journal rewrites, NORMAL sync (safe with WAL),
+    in-memory temp tables and a ~64MB page cache.
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-64000")
+    cursor.close()
+
+
+event.listen(engine, "connect", set_sqlite_pragmas)
+
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -1,10 +1,12 @@
-from fastapi import FastAPI, Depends, HTTPException, Query
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
-from typing import Optional
+from typing import Any, Dict, Optional
 
 from app.database import get_db, engine, Base
 from app import schemas, crud
-from app.utils import parse_offers_from_flipkart_response, calculate_discount
+from app.cache import discount_cache, offers_page_cache
+from app.serialization import ORJSONResponse, json_dumps, json_loads
+from app.utils import parse_offers_from_flipkart_response
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
@@ -13,12 +15,13 @@ Base.metadata.create_all(bind=engine)
 app = FastAPI(
     title="PiePay Backend API",
     description="API to detect and store Flipkart offers and calculate best discounts",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 
 @app.get("/")
-def read_root():
+async def read_root():
     """
     Root endpoint - API health check
     """
@@ -32,9 +35,43 @@ def read_root():
     }
 
 
-@app.post("/offer", response_model=schemas.OfferResponse)
+async def get_flipkart_offer_response(request: Request) -> Dict[str, Any]:
+    """
+    Read `flipkartOfferApiResponse` from the POST /offer body.
+    
+    The body is decoded with orjson (see app.serialization) and not
+    validated by Pydantic - the Flipkart response is an opaque, deeply
+    nested blob the parser walks itself, so a full validation pass over it
+    adds nothing.
+    """
+    try:
+        payload = json_loads(await request.body())
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Request body must be valid JSON")
+    
+    flipkart_response = payload.get('flipkartOfferApiResponse') if isinstance(payload, dict) else None
+    if not isinstance(flipkart_response, dict):
+        raise HTTPException(
+            status_code=422,
+            detail="flipkartOfferApiResponse must be a JSON object"
+        )
+    
+    return flipkart_response
+
+
+@app.post(
+    "/offer",
+    response_model=schemas.OfferResponse,
+    # Body is read by get_flipkart_offer_response; keep it documented in OpenAPI
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": schemas.OfferRequest.model_json_schema()}}
+        }
+    }
+)
 def create_offers(
-    request: schemas.OfferRequest,
+    flipkart_response: Dict[str, Any] = Depends(get_flipkart_offer_response),
     db: Session = Depends(get_db)
 ):
     """
@@ -59,9 +96,7 @@ def create_offers(
     """
     try:
         # Parse offers from Flipkart response
-        parsed_offers = parse_offers_from_flipkart_response(
-            request.flipkartOfferApiResponse
-        )
+        parsed_offers = parse_offers_from_flipkart_response(flipkart_response)
         
         if not parsed_offers:
             return schemas.OfferResponse(
@@ -72,6 +107,9 @@ def create_offers(
         # Create offers in batch
         total_identified, new_created = crud.create_offers_batch(db, parsed_offers)
         
+        if new_created:
+            discount_cache.invalidate()
+        
         return schemas.OfferResponse(
             noOfOffersIdentified=total_identified,
             noOfNewOffersCreated=new_created
@@ -112,28 +150,21 @@ def get_highest_discount(
     }
     ```
     """
+    # Read once so the result is cached under the version it was computed at
+    cache_version = discount_cache.version()
+    cached_discount = discount_cache.get(cache_version, bankName, paymentInstrument, amountToPay)
+    if cached_discount is not None:
+        return schemas.HighestDiscountResponse(highestDiscountAmount=cached_discount)
+    
     try:
-        # Get applicable offers based on payment instrument
-        if paymentInstrument:
-            offers = crud.get_offers_by_bank_and_instrument(db, bankName, paymentInstrument)
-        else:
-            offers = crud.get_offers_by_bank(db, bankName)
-        
-        if not offers:
-            return schemas.HighestDiscountResponse(highestDiscountAmount=0.0)
-        
-        # Calculate discount for each offer and find the highest
-        max_discount = 0.0
+        max_discount = crud.get_highest_discount(
+            db,
+            bankName,
+            amountToPay,
+            payment_instrument=paymentInstrument
+        )
         
-        for offer in offers:
-            discount = calculate_discount(
-                offer.offer_text,
-                offer.offer_description,
-                amountToPay
-            )
-            
-            if discount > max_discount:
-                max_discount = discount
+        discount_cache.set(cache_version, bankName, paymentInstrument, amountToPay, max_discount)
         
         return schemas.HighestDiscountResponse(highestDiscountAmount=max_discount)
     
@@ -146,26 +177,46 @@ def get_highest_discount(
 
 @app.get("/offers")
 def get_all_offers(
+    request: Request,
     skip: int = Query(0, description="Number of records to skip"),
     limit: int = Query(100, description="Maximum number of records to return"),
     db: Session = Depends(get_db)
 ):
     """
     Get all stored offers (for debugging/testing).
+    
+    Each page is serialized once per offers version and served with an
+    `ETag` (a hash of the body); a request with a matching `If-None-Match`
+    gets `304 Not Modified`.
     """
-    offers = crud.get_all_offers(db, skip=skip, limit=limit)
-    return {
-        "total": len(offers),
-        "offers": [
-            {
-                "offer_id": offer.offer_id,
-                "offer_text": offer.offer_text,
-                "banks": [bank.bank_code for bank in offer.banks],
-                "payment_instruments": [pi.instrument_type for pi in offer.payment_instruments]
-            }
-            for offer in offers
-        ]
-    }
+    # Read once so the page is cached under the version it was read at
+    cache_version = discount_cache.version()
+    page = offers_page_cache.get(cache_version, skip, limit)
+    
+    if page is None:
+        offers = crud.get_all_offers(db, skip=skip, limit=limit)
+        body = json_dumps({
+            "total": len(offers),
+            "offers": [
+                {
+                    "offer_id": offer.offer_id,
+                    "offer_text": offer.offer_text,
+                    "banks": [bank.bank_code for bank in offer.banks],
+                    "payment_instruments": [pi.instrument_type for pi in offer.payment_instruments]
+                }
+                for offer in offers
+            ]
+        })
+        page = offers_page_cache.set(cache_version, skip, limit, body)
+    
+    body, etag = page
+    headers = {"ETag": etag}
+    
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in (t.strip() for t in if_none_match.split(","))):
+        return Response(status_code=304, headers=headers)
+    
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @app.delete("/offers")
@@ -174,6 +225,7 @@ def delete_all_offers(db: Session = Depends(get_db)):
     Delete all offers (for testing/reset).
     """
     count = crud.delete_all_offers(db)
+    discount_cache.invalidate()
     return {
         "message": f"Successfully deleted {count} offers"
     }
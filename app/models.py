@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, Table
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, Index, Table
 from sqlalchemy.orm import relationship
 from app.database import Base
 
@@ -7,7 +7,9 @@ offer_bank_association = Table(
     'offer_bank_association',
     Base.metadata,
     Column('offer_id', Integer, ForeignKey('offers.id'), primary_key=True),
-    Column('bank_id', Integer, ForeignKey('banks.id'), primary_key=True)
+    Column('bank_id', Integer, ForeignKey('banks.id'), primary_key=True),
+    # The primary key leads with offer_id; this covers joins that start from a bank
+    Index('ix_oba_bank_offer', 'bank_id', 'offer_id')
 )
 
 # Association table for many-to-many relationship between Offer and PaymentInstrument
@@ -15,7 +17,9 @@ offer_payment_instrument_association = Table(
     'offer_payment_instrument_association',
     Base.metadata,
     Column('offer_id', Integer, ForeignKey('offers.id'), primary_key=True),
-    Column('payment_instrument_id', Integer, ForeignKey('payment_instruments.id'), primary_key=True)
+    Column('payment_instrument_id', Integer, ForeignKey('payment_instruments.id'), primary_key=True),
+    # The primary key leads with offer_id; this covers joins that start from an instrument
+    Index('ix_opia_pi_offer', 'payment_instrument_id', 'offer_id')
 )
 
 
@@ -28,6 +32,12 @@ class Offer(Base):
     offer_description = Column(String, nullable=False)  # Full terms and conditions
     logo = Column(String, nullable=True)  # Logo URL
     
+    # Discount terms parsed from offer_text/offer_description at ingest (see utils.parse_discount_terms)
+    min_order = Column(Float, nullable=True)  # Minimum order value
+    flat_discount = Column(Float, nullable=True)  # Fixed discount amount
+    pct_discount = Column(Float, nullable=True)  # Percentage discount
+    pct_cap = Column(Float, nullable=True)  # Max discount for percentage offers
+    
     # Relationships
     banks = relationship("Bank", secondary=offer_bank_association, back_populates="offers")
     payment_instruments = relationship("PaymentInstrument", secondary=offer_payment_instrument_association, back_populates="offers")
@@ -0,0 +1,48 @@
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # Fall back to the stdlib json module
+    orjson = None
+
+
+def json_loads(data: bytes) -> Any:
+    """
+    Decode a JSON document with orjson, or stdlib json if it isn't installed.
+    Raises ValueError (json.JSONDecodeError) on invalid input either way.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_dumps(content: Any) -> bytes:
+    """
+    Encode content as compact UTF-8 JSON with orjson, or stdlib json if it
+    isn't installed (same output format as Starlette's JSONResponse).
+    """
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":")
+    ).encode("utf-8")
+
+
+class ORJSONResponse(JSONResponse):
+    """
+    JSON response serialized with orjson (faster than stdlib json), or
+    with stdlib json if orjson isn't installed.
+    
+    Defined here rather than using fastapi.responses.ORJSONResponse, which
+    is deprecated in newer FastAPI releases.
+    """
+    
+    def render(self, content: Any) -> bytes:
+        return json_dumps(content)
@@ -1,8 +1,91 @@
 import re
-from typing import List, Dict, Any, Optional, Tuple
+import sys
+from functools import lru_cache
+from typing import List, Dict, Any, NamedTuple, Optional, Tuple
 
+# Compiled once at import; used in the /highest-discount hot loop.
+# Amounts may contain thousands separators ("₹1,000", "₹1,00,000") - commas
+# are stripped from the matched number only.
 
-def safe_get(data: Dict, *keys, default=None):
+# Offer text: a fixed "₹" amount or a percentage, found in one scan
+OFFER_TEXT_RE = re.compile(r'₹\s*(?P<rupee>\d[\d,]*(?:\.\d+)?)|(?P<percent>\d[\d,]*(?:\.\d+)?)\s*%')
+
+# Offer description: minimum order value and maximum cap, found in one scan.
+# Both alternatives are lookaheads so a long minimum-order clause can't
+# swallow a cap mentioned inside it.
+OFFER_TERMS_RE = re.compile(
+    r'(?=(?:min|minimum).*?(?:order|value|booking).*?₹\s*(?P<min_order>\d+(?:,\d+)?))'
+    r'|(?=(?:upto|up to|maximum|max)\s*₹\s*(?P<cap>\d+(?:,\d+)?))',
+    re.IGNORECASE
+)
+
+
+# Known locations of the payment options items array, tried in order
+KNOWN_ITEMS_PATHS = (
+    ('pageData', 'paymentOptions', 'items'),  # Standard SSR structure
+    ('paymentOptions', 'items'),  # Simplified
+    ('items',),  # Direct
+)
+
+
+def _to_float(number: str) -> float:
+    """Convert a matched number like "1,000" to 1000.0"""
+    return float(number.replace(',', ''))
+
+
+def _intern(value: Any) -> Any:
+    """Intern a bank code / instrument type (small, repeated vocabulary); non-strings pass through"""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _scan_offer_text(text: str) -> float:
+    """
+    Return the first "₹" amount in text, else the first percentage, else 0.
+    """
+    # Substring checks are far cheaper than a regex scan and most texts
+    # (e.g. "No cost EMI") contain neither symbol
+    has_rupee = '₹' in text
+    if not has_rupee and '%' not in text:
+        return 0.0
+    
+    percent: Optional[float] = None
+    for match in OFFER_TEXT_RE.finditer(text):
+        rupee = match.group('rupee')
+        if rupee is not None:
+            return _to_float(rupee)
+        if percent is None:
+            percent = _to_float(match.group('percent'))
+            if not has_rupee:
+                break  # No ₹ amount can follow
+    return percent if percent is not None else 0.0
+
+
+def _scan_offer_terms(description: str, want_cap: bool = True) -> Tuple[Optional[float], Optional[float]]:
+    """
+    Return (min_order_value, max_cap) from an offer description.
+    Either is None when not mentioned (max_cap is always None if not want_cap).
+    """
+    min_order_value: Optional[float] = None
+    max_cap: Optional[float] = None
+    
+    # Both terms are "₹" amounts
+    if '₹' not in description:
+        return min_order_value, max_cap
+    
+    for match in OFFER_TERMS_RE.finditer(description):
+        min_order = match.group('min_order')
+        if min_order is not None:
+            if min_order_value is None:
+                min_order_value = _to_float(min_order)
+        elif want_cap and max_cap is None:
+            max_cap = _to_float(match.group('cap'))
+        
+        if min_order_value is not None and (max_cap is not None or not want_cap):
+            break
+    return min_order_value, max_cap
+
+
+def safe_get(data: Any, *keys: str, default: Any = None) -> Any:
     """
     Safely navigate nested dictionary keys.
     Example: safe_get(data, 'pageData', 'paymentOptions', 'items')
@@ -29,80 +112,103 @@ def extract_discount_amount(text: str) -> float:
     if not text:
         return 0.0
     
-    # Remove commas from numbers
-    text = text.replace(',', '')
-    
-    # Pattern for fixed amount: ₹10, ₹50, ₹100, etc.
-    rupee_pattern = r'₹\s*(\d+(?:\.\d+)?)'
-    matches = re.findall(rupee_pattern, text)
-    
-    if matches:
-        # Return the first match (usually the discount amount)
-        return float(matches[0])
-    
-    # Pattern for percentage: 5%, 10%, etc.
-    percent_pattern = r'(\d+(?:\.\d+)?)\s*%'
-    percent_matches = re.findall(percent_pattern, text)
-    
-    if percent_matches:
-        # For percentage offers, return the percentage value
-        return float(percent_matches[0])
-    
-    return 0.0
+    # A fixed amount (₹10, ₹50, ...) takes precedence over a percentage (5%, 10%, ...)
+    return _scan_offer_text(text)
 
 
-def find_offer_list_items(data: Any, path: str = "root") -> List[Any]:
+def find_offer_list_items(data: Any) -> List[Any]:
     """
-    Recursively search for items array that contains OFFER_LIST type.
+    Search the whole tree for items arrays that contain an OFFER_LIST type.
     This handles multiple possible JSON structures.
+    
+    Walks iteratively (no recursion) in document order and doesn't descend
+    into an items array once it has been matched.
     """
-    items_list = []
+    items_list: List[Any] = []
+    stack: List[Any] = [data]
     
-    if isinstance(data, dict):
-        # Check if current dict has 'items' key
-        if 'items' in data and isinstance(data['items'], list):
-            # Check if any item is OFFER_LIST
-            for item in data['items']:
-                if isinstance(item, dict) and item.get('type') == 'OFFER_LIST':
-                    items_list.extend(data['items'])
-                    break
+    while stack:
+        node = stack.pop()
         
-        # Recursively search in all dict values
-        for key, value in data.items():
-            items_list.extend(find_offer_list_items(value, f"{path}.{key}"))
-    
-    elif isinstance(data, list):
-        for idx, item in enumerate(data):
-            items_list.extend(find_offer_list_items(item, f"{path}[{idx}]"))
+        if isinstance(node, dict):
+            # Check if current dict has an 'items' list with an OFFER_LIST in it
+            items = node.get('items')
+            if isinstance(items, list) and any(
+                isinstance(item, dict) and item.get('type') == 'OFFER_LIST' for item in items
+            ):
+                items_list.extend(items)
+                continue
+            
+            # Reversed so children are visited in their original order
+            stack.extend(reversed(list(node.values())))
+        
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
     
     return items_list
 
 
-def extract_offers_from_items(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def _walk_items(items: List[Any]) -> Tuple[List[str], List[Dict[str, Any]]]:
     """
-    Extract offer list from items array.
-    Handles the offer structure extraction.
+    Single pass over an items array.
+    Returns: (payment_instruments, offers) - instruments from PAYMENT_OPTION
+    items (unique, in order seen) and offers from OFFER_LIST items.
     """
-    offers = []
+    instruments: Dict[str, None] = {}
+    offers: List[Dict[str, Any]] = []
     
     for item in items:
         if not isinstance(item, dict):
             continue
-            
-        # Check if this is an OFFER_LIST type
-        if item.get('type') == 'OFFER_LIST':
-            # Try multiple possible paths to offer list
+        
+        item_type = item.get('type')
+        
+        if item_type == 'PAYMENT_OPTION':
+            data = item.get('data')
+            instrument_type = data.get('instrumentType') if isinstance(data, dict) else None
+            if instrument_type:
+                instruments[_intern(instrument_type)] = None
+        
+        elif item_type == 'OFFER_LIST':
+            # Try multiple possible paths to offer list:
+            # data.offers.offerList, data.offerList, offers.offerList, offerList
+            data = item.get('data')
+            data = data if isinstance(data, dict) else {}
+            data_offers = data.get('offers')
+            item_offers = item.get('offers')
             offer_list = (
-                safe_get(item, 'data', 'offers', 'offerList') or
-                safe_get(item, 'data', 'offerList') or
-                safe_get(item, 'offers', 'offerList') or
-                safe_get(item, 'offerList') or
+                (data_offers.get('offerList') if isinstance(data_offers, dict) else None) or
+                data.get('offerList') or
+                (item_offers.get('offerList') if isinstance(item_offers, dict) else None) or
+                item.get('offerList') or
                 []
             )
             
             if isinstance(offer_list, list):
                 offers.extend(offer_list)
     
+    return list(instruments), offers
+
+
+def _find_payment_option_items(flipkart_response: Dict[str, Any]) -> Optional[List[Any]]:
+    """
+    Find the payment options items array at one of the known paths.
+    """
+    items: Any = None
+    for path in KNOWN_ITEMS_PATHS:
+        items = safe_get(flipkart_response, *path)
+        if items:
+            break
+    
+    return items if items and isinstance(items, list) else None
+
+
+def extract_offers_from_items(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Extract offer list from items array.
+    Handles the offer structure extraction.
+    """
+    _, offers = _walk_items(items)
     return offers
 
 
@@ -111,33 +217,21 @@ def extract_payment_instruments_from_response(flipkart_response: Dict[str, Any])
     Extract payment instruments from response.
     Returns: (offer_instrument_mapping, list_of_instruments)
     """
-    offer_instrument_mapping = {}
-    payment_instruments_found = set()
+    offer_instrument_mapping: Dict[str, List[str]] = {}
     
     try:
-        items = safe_get(flipkart_response, 'pageData', 'paymentOptions', 'items')
-        if not items:
-            items = safe_get(flipkart_response, 'paymentOptions', 'items')
-        if not items:
-            items = safe_get(flipkart_response, 'items')
+        items = _find_payment_option_items(flipkart_response)
         
-        if not items or not isinstance(items, list):
+        if not items:
             return offer_instrument_mapping, []
         
-        for item in items:
-            if not isinstance(item, dict):
-                continue
-            
-            if item.get('type') == 'PAYMENT_OPTION':
-                instrument_type = safe_get(item, 'data', 'instrumentType')
-                if instrument_type:
-                    payment_instruments_found.add(instrument_type)
+        instruments, _ = _walk_items(items)
         
     except Exception as e:
         print(f"Error extracting payment instruments: {e}")
         return offer_instrument_mapping, []
     
-    return offer_instrument_mapping, list(payment_instruments_found)
+    return offer_instrument_mapping, instruments
 
 
 def parse_offers_from_flipkart_response(flipkart_response: Dict[str, Any]) -> List[Dict[str, Any]]:
@@ -145,60 +239,65 @@ def parse_offers_from_flipkart_response(flipkart_response: Dict[str, Any]) -> Li
     Parse offers from Flipkart's SSR response.
     Handles multiple possible JSON structures.
     """
-    parsed_offers = []
+    parsed_offers: List[Dict[str, Any]] = []
     
     try:
-        # Extract payment instruments
-        _, available_instruments = extract_payment_instruments_from_response(flipkart_response)
-        
-        # Find items
-        items = safe_get(flipkart_response, 'pageData', 'paymentOptions', 'items')
-        if not items:
-            items = safe_get(flipkart_response, 'paymentOptions', 'items')
-        if not items:
-            items = safe_get(flipkart_response, 'items')
-        if not items:
-            items = find_offer_list_items(flipkart_response)
+        # Find items at a known path; payment instruments and offers come
+        # from the same single walk over them
+        items = _find_payment_option_items(flipkart_response)
         
-        if not items or not isinstance(items, list):
-            return parsed_offers
-        
-        # Extract offers
-        offers = extract_offers_from_items(items)
+        if items:
+            available_instruments, offers = _walk_items(items)
+        else:
+            # Fall back to searching the whole tree (offers only)
+            available_instruments = []
+            offers = extract_offers_from_items(find_offer_list_items(flipkart_response))
         
         if not offers:
             return parsed_offers
         
         # Parse each offer
         for offer in offers:
+            if not isinstance(offer, dict):
+                continue
+            
             try:
+                # Plain .get() chains rather than safe_get: this runs for every offer
+                text_obj = offer.get('offerText')
+                desc_obj = offer.get('offerDescription')
+                text_fields = text_obj if isinstance(text_obj, dict) else {}
+                desc_fields = desc_obj if isinstance(desc_obj, dict) else {}
+                
                 offer_id = (
-                    safe_get(offer, 'offerDescription', 'id') or
-                    safe_get(offer, 'id') or
-                    safe_get(offer, 'offerId')
+                    desc_fields.get('id') or
+                    offer.get('id') or
+                    offer.get('offerId')
                 )
                 
                 if not offer_id:
                     continue
                 
+                # offer_id is a String column; numeric ids must match what RETURNING gives back
+                offer_id = str(offer_id)
+                
                 offer_text = (
-                    safe_get(offer, 'offerText', 'text') or
-                    safe_get(offer, 'offerText') or
-                    safe_get(offer, 'text') or
+                    text_fields.get('text') or
+                    text_obj or
+                    offer.get('text') or
                     ''
                 )
                 
                 offer_description = (
-                    safe_get(offer, 'offerDescription', 'text') or
-                    safe_get(offer, 'description') or
-                    safe_get(offer, 'offerDescription') or
+                    desc_fields.get('text') or
+                    offer.get('description') or
+                    desc_obj or
                     ''
                 )
                 
-                logo = safe_get(offer, 'logo', default='')
+                logo = offer.get('logo', '')
                 
-                providers = safe_get(offer, 'provider', default=[])
-                bank_codes = [code for code in providers if code] if isinstance(providers, list) else []
+                providers = offer.get('provider', [])
+                bank_codes = [_intern(code) for code in providers if code] if isinstance(providers, list) else []
                 
                 # Assign payment instruments if offer has banks
                 payment_instruments = available_instruments.copy() if bank_codes and available_instruments else []
@@ -222,34 +321,60 @@ def parse_offers_from_flipkart_response(flipkart_response: Dict[str, Any]) -> Li
     return parsed_offers
 
 
-def calculate_discount(offer_text: str, offer_description: str, amount_to_pay: float) -> float:
+class DiscountTerms(NamedTuple):
     """
-    Calculate actual discount amount.
+    Numbers parsed from an offer that determine its discount.
+    Stored on each Offer at ingest so /highest-discount can be computed in SQL.
     """
-    # Check minimum order value first (applies to all offers)
-    min_pattern = r'(?:min|minimum).*?(?:order|value|booking).*?₹\s*(\d+(?:,\d+)?)'
-    min_match = re.search(min_pattern, offer_description, re.IGNORECASE)
+    min_order: Optional[float]  # Minimum order value, None if not mentioned
+    flat_discount: Optional[float]  # Fixed discount, None for percentage offers
+    pct_discount: Optional[float]  # Percentage, None for flat offers
+    pct_cap: Optional[float]  # Maximum discount for percentage offers, None if uncapped
+
+
+@lru_cache(maxsize=4096)
+def parse_discount_terms(offer_text: str, offer_description: str) -> DiscountTerms:
+    """
+    Parse minimum order value, discount and cap from offer text/description.
+    Cached per (offer_text, offer_description) - the same offer strings are
+    evaluated for many amounts, and many offers share the same wording.
+    The cache is per process (each worker keeps its own).
+    """
+    discount = _scan_offer_text(offer_text)
+    is_percentage = '%' in offer_text
     
-    if min_match:
-        min_order_value = float(min_match.group(1).replace(',', ''))
-        if amount_to_pay < min_order_value:
-            return 0.0
+    # The cap only matters for percentage offers
+    min_order_value, max_discount = _scan_offer_terms(offer_description, want_cap=is_percentage)
     
-    discount = extract_discount_amount(offer_text)
+    if is_percentage:
+        return DiscountTerms(min_order_value, None, discount, max_discount)
     
-    # Check if percentage offer
-    if '%' in offer_text:
-        discount_amount = (discount / 100) * amount_to_pay
-        
-        # Check for max cap
-        cap_pattern = r'(?:upto|up to|maximum|max)\s*₹\s*(\d+(?:,\d+)?)'
-        cap_match = re.search(cap_pattern, offer_description, re.IGNORECASE)
+    return DiscountTerms(min_order_value, discount, None, None)
+
+
+def apply_discount_terms(terms: DiscountTerms, amount_to_pay: float) -> float:
+    """
+    Calculate actual discount amount from parsed terms.
+    """
+    # Check minimum order value first (applies to all offers)
+    if terms.min_order is not None and amount_to_pay < terms.min_order:
+        return 0.0
+    
+    if terms.pct_discount is not None:
+        discount_amount = (terms.pct_discount / 100) * amount_to_pay
         
-        if cap_match:
-            max_discount = float(cap_match.group(1).replace(',', ''))
-            discount_amount = min(discount_amount, max_discount)
+        # Apply max cap
+        if terms.pct_cap is not None:
+            discount_amount = min(discount_amount, terms.pct_cap)
         
         return discount_amount
     
     # Return flat discount
-    return discount
\ No newline at end of file
+    return terms.flat_discount if terms.flat_discount is not None else 0.0
+
+
+def calculate_discount(offer_text: str, offer_description: str, amount_to_pay: float) -> float:
+    """
+    Calculate actual discount amount.
+    """
+    return apply_discount_terms(parse_discount_terms(offer_text, offer_description), amount_to_pay)
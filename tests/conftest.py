@@ -0,0 +1,128 @@
+"""
+Shared pytest fixtures
+"""
+import copy
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.main import app
+from app.cache import discount_cache
+from app.database import Base, get_db, set_sqlite_pragmas
+
+# Test database (in-memory; StaticPool shares the one connection across threads)
+SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool
+)
+event.listen(engine, "connect", set_sqlite_pragmas)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+
+@pytest.fixture(scope="session", autouse=True)
+def test_database():
+    """Create the schema once per test session and route get_db to it"""
+    Base.metadata.create_all(bind=engine)
+    app.dependency_overrides[get_db] = override_get_db
+    yield
+    app.dependency_overrides.pop(get_db, None)
+    Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture
+def db_session():
+    """Session on the test database"""
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def cleanup(db_session):
+    """Clean database after each test"""
+    yield
+    # Delete all rows (children first); the schema is created once per session
+    for table in reversed(Base.metadata.sorted_tables):
+        db_session.execute(table.delete())
+    db_session.commit()
+    discount_cache.invalidate()
+
+
+@pytest.fixture
+def anyio_backend():
+    """Run async tests on asyncio only"""
+    return "asyncio"
+
+
+@pytest.fixture
+async def client():
+    """Async HTTP client calling the app in-process over ASGI"""
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
+        yield c
+
+
+@pytest.fixture(scope="module")
+def offer_template():
+    """POST /offer body with a single offer at the standard SSR path"""
+    return {
+        "flipkartOfferApiResponse": {
+            "pageData": {
+                "paymentOptions": {
+                    "items": [
+                        {
+                            "type": "OFFER_LIST",
+                            "data": {
+                                "offers": {
+                                    "offerList": [
+                                        {
+                                            "provider": [],
+                                            "offerText": {"text": ""},
+                                            "offerDescription": {"id": "", "text": ""}
+                                        }
+                                    ]
+                                }
+                            }
+                        }
+                    ]
+                }
+            }
+        }
+    }
+
+
+@pytest.fixture
+def make_offer_payload(offer_template):
+    """
+    Build a POST /offer body from offer_template.
+    Only the offer's leaves (and an optional PAYMENT_OPTION item) differ between tests.
+    """
+    def build(offer_id, provider, text, description, instrument_type=None):
+        payload = copy.deepcopy(offer_template)
+        items = payload["flipkartOfferApiResponse"]["pageData"]["paymentOptions"]["items"]
+        
+        offer = items[0]["data"]["offers"]["offerList"][0]
+        offer["provider"] = [provider]
+        offer["offerText"]["text"] = text
+        offer["offerDescription"]["id"] = offer_id
+        offer["offerDescription"]["text"] = description
+        
+        if instrument_type:
+            items.append({"type": "PAYMENT_OPTION", "data": {"instrumentType": instrument_type}})
+        
+        return payload
+    
+    return build
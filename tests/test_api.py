@@ -2,302 +2,113 @@
 Test suite for API endpoints
 """
 import pytest
-from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from app.main import app
-from app.database import Base, get_db
+from app import main
+from app.cache import OffersPageCache, discount_cache
 
-# Create test database
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+pytestmark = [pytest.mark.anyio, pytest.mark.usefixtures("cleanup")]
 
-# Create tables
-Base.metadata.create_all(bind=engine)
 
-
-def override_get_db():
-    try:
-        db = TestingSessionLocal()
-        yield db
-    finally:
-        db.close()
-
-
-app.dependency_overrides[get_db] = override_get_db
-client = TestClient(app)
-
-
-@pytest.fixture(autouse=True)
-def cleanup():
-    """Clean database before each test"""
-    yield
-    # Clean up after test
-    Base.metadata.drop_all(bind=engine)
-    Base.metadata.create_all(bind=engine)
-
-
-def test_read_root():
+async def test_read_root(client):
     """Test root endpoint"""
-    response = client.get("/")
+    response = await client.get("/")
     assert response.status_code == 200
     data = response.json()
     assert data["status"] == "running"
     assert "endpoints" in data
 
 
-def test_post_offer_success():
+async def test_post_offer_success(client, make_offer_payload):
     """Test creating offers successfully"""
-    payload = {
-        "flipkartOfferApiResponse": {
-            "pageData": {
-                "paymentOptions": {
-                    "items": [
-                        {
-                            "type": "OFFER_LIST",
-                            "data": {
-                                "offers": {
-                                    "offerList": [
-                                        {
-                                            "provider": ["AXIS"],
-                                            "offerText": {"text": "Get ₹100 cashback"},
-                                            "offerDescription": {
-                                                "id": "TEST001",
-                                                "text": "Test offer"
-                                            }
-                                        }
-                                    ]
-                                }
-                            }
-                        },
-                        {
-                            "type": "PAYMENT_OPTION",
-                            "data": {"instrumentType": "CREDIT"}
-                        }
-                    ]
-                }
-            }
-        }
-    }
+    payload = make_offer_payload(
+        "TEST001", "AXIS", "Get ₹100 cashback", "Test offer", instrument_type="CREDIT"
+    )
     
-    response = client.post("/offer", json=payload)
+    response = await client.post("/offer", json=payload)
     assert response.status_code == 200
     data = response.json()
     assert data["noOfOffersIdentified"] == 1
     assert data["noOfNewOffersCreated"] == 1
 
 
-def test_post_offer_duplicate():
+async def test_post_offer_duplicate(client, make_offer_payload):
     """Test duplicate offer prevention"""
-    payload = {
-        "flipkartOfferApiResponse": {
-            "pageData": {
-                "paymentOptions": {
-                    "items": [
-                        {
-                            "type": "OFFER_LIST",
-                            "data": {
-                                "offers": {
-                                    "offerList": [
-                                        {
-                                            "provider": ["AXIS"],
-                                            "offerText": {"text": "Get ₹100 cashback"},
-                                            "offerDescription": {
-                                                "id": "TEST002",
-                                                "text": "Test offer"
-                                            }
-                                        }
-                                    ]
-                                }
-                            }
-                        }
-                    ]
-                }
-            }
-        }
-    }
+    payload = make_offer_payload("TEST002", "AXIS", "Get ₹100 cashback", "Test offer")
     
     # First request
-    response1 = client.post("/offer", json=payload)
+    response1 = await client.post("/offer", json=payload)
     assert response1.json()["noOfNewOffersCreated"] == 1
     
     # Second request - duplicate
-    response2 = client.post("/offer", json=payload)
+    response2 = await client.post("/offer", json=payload)
     assert response2.json()["noOfNewOffersCreated"] == 0
     assert response2.json()["noOfOffersIdentified"] == 1
 
 
-def test_get_highest_discount():
+async def test_get_highest_discount(client, make_offer_payload):
     """Test getting highest discount"""
     # First create an offer
-    payload = {
-        "flipkartOfferApiResponse": {
-            "pageData": {
-                "paymentOptions": {
-                    "items": [
-                        {
-                            "type": "OFFER_LIST",
-                            "data": {
-                                "offers": {
-                                    "offerList": [
-                                        {
-                                            "provider": ["AXIS"],
-                                            "offerText": {"text": "Get ₹100 cashback"},
-                                            "offerDescription": {
-                                                "id": "TEST003",
-                                                "text": "Flat ₹100 cashback. Min Order ₹5000"
-                                            }
-                                        }
-                                    ]
-                                }
-                            }
-                        },
-                        {
-                            "type": "PAYMENT_OPTION",
-                            "data": {"instrumentType": "CREDIT"}
-                        }
-                    ]
-                }
-            }
-        }
-    }
-    client.post("/offer", json=payload)
+    payload = make_offer_payload(
+        "TEST003", "AXIS", "Get ₹100 cashback", "Flat ₹100 cashback. Min Order ₹5000",
+        instrument_type="CREDIT"
+    )
+    await client.post("/offer", json=payload)
     
     # Get highest discount
-    response = client.get("/highest-discount?amountToPay=10000&bankName=AXIS")
+    response = await client.get("/highest-discount?amountToPay=10000&bankName=AXIS")
     assert response.status_code == 200
     data = response.json()
     assert data["highestDiscountAmount"] == 100.0
 
 
-def test_get_highest_discount_with_payment_instrument():
+async def test_get_highest_discount_with_payment_instrument(client, make_offer_payload):
     """Test highest discount with payment instrument filter"""
     # Create offer
-    payload = {
-        "flipkartOfferApiResponse": {
-            "pageData": {
-                "paymentOptions": {
-                    "items": [
-                        {
-                            "type": "OFFER_LIST",
-                            "data": {
-                                "offers": {
-                                    "offerList": [
-                                        {
-                                            "provider": ["HDFC"],
-                                            "offerText": {"text": "Get ₹200 off"},
-                                            "offerDescription": {
-                                                "id": "TEST004",
-                                                "text": "Flat ₹200 off"
-                                            }
-                                        }
-                                    ]
-                                }
-                            }
-                        },
-                        {
-                            "type": "PAYMENT_OPTION",
-                            "data": {"instrumentType": "CREDIT"}
-                        }
-                    ]
-                }
-            }
-        }
-    }
-    client.post("/offer", json=payload)
+    payload = make_offer_payload(
+        "TEST004", "HDFC", "Get ₹200 off", "Flat ₹200 off", instrument_type="CREDIT"
+    )
+    await client.post("/offer", json=payload)
     
     # Get with payment instrument
-    response = client.get(
+    response = await client.get(
         "/highest-discount?amountToPay=10000&bankName=HDFC&paymentInstrument=CREDIT"
     )
     assert response.status_code == 200
     assert response.json()["highestDiscountAmount"] == 200.0
 
 
-def test_get_highest_discount_nonexistent_bank():
+async def test_get_highest_discount_nonexistent_bank(client):
     """Test getting discount for non-existent bank"""
-    response = client.get("/highest-discount?amountToPay=10000&bankName=NONEXISTENT")
+    response = await client.get("/highest-discount?amountToPay=10000&bankName=NONEXISTENT")
     assert response.status_code == 200
     assert response.json()["highestDiscountAmount"] == 0.0
 
 
-def test_get_highest_discount_below_minimum():
+async def test_get_highest_discount_below_minimum(client, make_offer_payload):
     """Test discount when amount is below minimum"""
     # Create offer with min value
-    payload = {
-        "flipkartOfferApiResponse": {
-            "pageData": {
-                "paymentOptions": {
-                    "items": [
-                        {
-                            "type": "OFFER_LIST",
-                            "data": {
-                                "offers": {
-                                    "offerList": [
-                                        {
-                                            "provider": ["ICICI"],
-                                            "offerText": {"text": "Get ₹500 off"},
-                                            "offerDescription": {
-                                                "id": "TEST005",
-                                                "text": "Flat ₹500 off. Min Order ₹10000"
-                                            }
-                                        }
-                                    ]
-                                }
-                            }
-                        }
-                    ]
-                }
-            }
-        }
-    }
-    client.post("/offer", json=payload)
+    payload = make_offer_payload(
+        "TEST005", "ICICI", "Get ₹500 off", "Flat ₹500 off. Min Order ₹10000"
+    )
+    await client.post("/offer", json=payload)
     
     # Amount below minimum
-    response = client.get("/highest-discount?amountToPay=5000&bankName=ICICI")
+    response = await client.get("/highest-discount?amountToPay=5000&bankName=ICICI")
     assert response.status_code == 200
     assert response.json()["highestDiscountAmount"] == 0.0
 
 
-def test_get_highest_discount_percentage_with_cap():
+async def test_get_highest_discount_percentage_with_cap(client, make_offer_payload):
     """Test percentage discount with cap"""
-    payload = {
-        "flipkartOfferApiResponse": {
-            "pageData": {
-                "paymentOptions": {
-                    "items": [
-                        {
-                            "type": "OFFER_LIST",
-                            "data": {
-                                "offers": {
-                                    "offerList": [
-                                        {
-                                            "provider": ["SBI"],
-                                            "offerText": {"text": "Get 5% cashback"},
-                                            "offerDescription": {
-                                                "id": "TEST006",
-                                                "text": "5% cashback up to ₹500"
-                                            }
-                                        }
-                                    ]
-                                }
-                            }
-                        }
-                    ]
-                }
-            }
-        }
-    }
-    client.post("/offer", json=payload)
+    payload = make_offer_payload("TEST006", "SBI", "Get 5% cashback", "5% cashback up to ₹500")
+    await client.post("/offer", json=payload)
     
     # 5% of 20000 = 1000, but capped at 500
-    response = client.get("/highest-discount?amountToPay=20000&bankName=SBI")
+    response = await client.get("/highest-discount?amountToPay=20000&bankName=SBI")
     assert response.status_code == 200
     assert response.json()["highestDiscountAmount"] == 500.0
 
 
-def test_get_all_offers():
+async def test_get_all_offers(client):
     """Test getting all offers"""
     # Create some offers
     payload = {
@@ -329,21 +140,208 @@ def test_get_all_offers():
             }
         }
     }
-    client.post("/offer", json=payload)
+    await client.post("/offer", json=payload)
     
-    response = client.get("/offers")
+    response = await client.get("/offers")
     assert response.status_code == 200
     data = response.json()
     assert data["total"] == 2
     assert len(data["offers"]) == 2
+    assert sorted(bank for o in data["offers"] for bank in o["banks"]) == ["AXIS", "HDFC"]
 
 
-def test_post_offer_empty_response():
+async def test_get_all_offers_etag(client, make_offer_payload):
+    """Test GET /offers revalidation with ETag / If-None-Match"""
+    response = await client.get("/offers")
+    etag = response.headers["ETag"]
+    assert response.json()["total"] == 0
+    
+    # Unchanged offers - not modified
+    response = await client.get("/offers", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    
+    # Storing an offer changes the ETag
+    await client.post("/offer", json=make_offer_payload("TEST014", "AXIS", "Get ₹100 off", "Flat ₹100 off"))
+    
+    response = await client.get("/offers", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json()["total"] == 1
+
+
+async def test_get_all_offers_etag_after_restart(client, make_offer_payload, monkeypatch):
+    """Test an ETag handed out before a restart doesn't match changed offers"""
+    monkeypatch.setattr(discount_cache, "_local_version", 0)
+    response = await client.get("/offers")
+    etag = response.headers["ETag"]
+    
+    await client.post("/offer", json=make_offer_payload("TEST015", "AXIS", "Get ₹100 off", "Flat ₹100 off"))
+    
+    # A fresh process starts over at version 0 with an empty page cache
+    monkeypatch.setattr(discount_cache, "_local_version", 0)
+    monkeypatch.setattr(main, "offers_page_cache", OffersPageCache())
+    
+    response = await client.get("/offers", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["total"] == 1
+
+
+async def test_post_offer_numeric_id(client):
+    """Test offers whose id is a JSON number are stored, counted and linked"""
+    payload = {
+        "flipkartOfferApiResponse": {
+            "items": [
+                {
+                    "type": "OFFER_LIST",
+                    "data": {
+                        "offerList": [
+                            {
+                                "provider": ["AXIS"],
+                                "offerText": {"text": "Get ₹150 off"},
+                                "offerId": 12345
+                            }
+                        ]
+                    }
+                }
+            ]
+        }
+    }
+    
+    response = await client.post("/offer", json=payload)
+    assert response.json()["noOfNewOffersCreated"] == 1
+    
+    response = await client.post("/offer", json=payload)
+    assert response.json()["noOfNewOffersCreated"] == 0
+    
+    response = await client.get("/highest-discount?amountToPay=10000&bankName=AXIS")
+    assert response.json()["highestDiscountAmount"] == 150.0
+
+
+async def test_post_offer_empty_response(client):
     """Test posting empty offer response"""
     payload = {"flipkartOfferApiResponse": {}}
     
-    response = client.post("/offer", json=payload)
+    response = await client.post("/offer", json=payload)
     assert response.status_code == 200
     data = response.json()
     assert data["noOfOffersIdentified"] == 0
-    assert data["noOfNewOffersCreated"] == 0
\ No newline at end of file
+    assert data["noOfNewOffersCreated"] == 0
+
+
+async def test_post_offer_duplicate_within_payload(client):
+    """Test same offer repeated in one payload is stored once"""
+    offer = {
+        "provider": ["AXIS"],
+        "offerText": {"text": "Get ₹100 cashback"},
+        "offerDescription": {"id": "TEST009", "text": "Test offer"}
+    }
+    payload = {
+        "flipkartOfferApiResponse": {
+            "pageData": {
+                "paymentOptions": {
+                    "items": [
+                        {
+                            "type": "OFFER_LIST",
+                            "data": {"offers": {"offerList": [offer, offer]}}
+                        }
+                    ]
+                }
+            }
+        }
+    }
+    
+    response = await client.post("/offer", json=payload)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["noOfOffersIdentified"] == 2
+    assert data["noOfNewOffersCreated"] == 1
+
+
+async def test_get_highest_discount_refreshes_after_new_offer(client):
+    """Test cached discount is invalidated when new offers are stored"""
+    response = await client.get("/highest-discount?amountToPay=10000&bankName=KOTAK")
+    assert response.json()["highestDiscountAmount"] == 0.0
+    
+    payload = {
+        "flipkartOfferApiResponse": {
+            "items": [
+                {
+                    "type": "OFFER_LIST",
+                    "data": {
+                        "offerList": [
+                            {
+                                "provider": ["KOTAK"],
+                                "offerText": {"text": "Get ₹300 off"},
+                                "offerDescription": {"id": "TEST010", "text": "Flat ₹300 off"}
+                            }
+                        ]
+                    }
+                }
+            ]
+        }
+    }
+    await client.post("/offer", json=payload)
+    
+    response = await client.get("/highest-discount?amountToPay=10000&bankName=KOTAK")
+    assert response.json()["highestDiscountAmount"] == 300.0
+
+
+async def test_get_highest_discount_picks_best_offer(client):
+    """Test highest discount is chosen across flat and percentage offers"""
+    payload = {
+        "flipkartOfferApiResponse": {
+            "items": [
+                {
+                    "type": "OFFER_LIST",
+                    "data": {
+                        "offerList": [
+                            {
+                                "provider": ["AXIS"],
+                                "offerText": {"text": "Get ₹100 off"},
+                                "offerDescription": {"id": "TEST011", "text": "Flat ₹100 off"}
+                            },
+                            {
+                                "provider": ["AXIS"],
+                                "offerText": {"text": "Get 10% off"},
+                                "offerDescription": {"id": "TEST012", "text": "10% off up to ₹500"}
+                            },
+                            {
+                                "provider": ["AXIS"],
+                                "offerText": {"text": "Get ₹1000 off"},
+                                "offerDescription": {"id": "TEST013", "text": "Flat ₹1000 off. Min order ₹50000"}
+                            }
+                        ]
+                    }
+                }
+            ]
+        }
+    }
+    await client.post("/offer", json=payload)
+    
+    # 10% of 3000 = 300 beats flat 100; the ₹1000 offer needs ₹50000
+    response = await client.get("/highest-discount?amountToPay=3000&bankName=AXIS")
+    assert response.json()["highestDiscountAmount"] == 300.0
+    
+    # 10% of 20000 is capped at 500
+    response = await client.get("/highest-discount?amountToPay=20000&bankName=AXIS")
+    assert response.json()["highestDiscountAmount"] == 500.0
+    
+    response = await client.get("/highest-discount?amountToPay=50000&bankName=AXIS")
+    assert response.json()["highestDiscountAmount"] == 1000.0
+
+
+async def test_post_offer_invalid_body(client):
+    """Test malformed POST /offer bodies are rejected"""
+    response = await client.post("/offer", json={})
+    assert response.status_code == 422
+    
+    response = await client.post("/offer", json={"flipkartOfferApiResponse": []})
+    assert response.status_code == 422
+    
+    response = await client.post(
+        "/offer",
+        content=b"not json",
+        headers={"Content-Type": "application/json"}
+    )
+    assert response.status_code == 422
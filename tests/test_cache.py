@@ -0,0 +1,36 @@
+"""
+Test suite for the discount cache
+"""
+from app.cache import DiscountCache
+
+
+def test_cache_hit():
+    """Test a stored discount is returned at the same version"""
+    cache = DiscountCache()
+    version = cache.version()
+    
+    assert cache.get(version, "AXIS", None, 10000.0) is None
+    cache.set(version, "AXIS", None, 10000.0, 100.0)
+    assert cache.get(cache.version(), "AXIS", None, 10000.0) == 100.0
+
+
+def test_cache_set_after_invalidate_is_not_served():
+    """Test a result computed before an invalidate() isn't served after it"""
+    cache = DiscountCache()
+    
+    # Miss, then offers change before the (stale) result is stored
+    version = cache.version()
+    assert cache.get(version, "AXIS", None, 10000.0) is None
+    cache.invalidate()
+    cache.set(version, "AXIS", None, 10000.0, 0.0)
+    
+    assert cache.get(cache.version(), "AXIS", None, 10000.0) is None
+
+
+def test_cache_local_entries_expire():
+    """Test in-process entries expire after local_ttl"""
+    cache = DiscountCache(local_ttl=0)
+    version = cache.version()
+    
+    cache.set(version, "AXIS", None, 10000.0, 100.0)
+    assert cache.get(version, "AXIS", None, 10000.0) is None
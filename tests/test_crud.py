@@ -0,0 +1,47 @@
+"""
+Test suite for database operations
+"""
+import pytest
+from sqlalchemy import func, select
+from app import crud, models
+
+pytestmark = pytest.mark.usefixtures("cleanup")
+
+
+def make_offer(offer_id, bank_code="AXIS", instrument_type="CREDIT"):
+    """Parsed offer dict as returned by parse_offers_from_flipkart_response"""
+    return {
+        'offer_id': offer_id,
+        'offer_text': "Get ₹100 off",
+        'offer_description': "Flat ₹100 off",
+        'logo': '',
+        'bank_codes': [bank_code],
+        'payment_instruments': [instrument_type]
+    }
+
+
+def count_rows(db, table):
+    return db.scalar(select(func.count()).select_from(table))
+
+
+def test_create_offers_batch_across_chunks(db_session, monkeypatch):
+    """Test offers split over several chunks, with duplicates on both sides of a chunk boundary"""
+    monkeypatch.setattr(crud, "OFFER_CHUNK_SIZE", 2)
+    
+    # Chunks: [O1, O2] [O2, O3] [O4, O1]
+    offers = [
+        make_offer("O1"), make_offer("O2"),
+        make_offer("O2"), make_offer("O3"),
+        make_offer("O4", bank_code="HDFC", instrument_type="UPI"), make_offer("O1")
+    ]
+    
+    assert crud.create_offers_batch(db_session, offers) == (6, 4)
+    
+    assert count_rows(db_session, models.Offer) == 4
+    assert count_rows(db_session, models.offer_bank_association) == 4
+    assert count_rows(db_session, models.offer_payment_instrument_association) == 4
+    assert crud.get_highest_discount(db_session, "HDFC", 10000, payment_instrument="UPI") == 100.0
+    
+    # Resending the same offers creates nothing new
+    assert crud.create_offers_batch(db_session, offers) == (6, 0)
+    assert count_rows(db_session, models.offer_bank_association) == 4
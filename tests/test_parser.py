@@ -253,4 +253,38 @@ def test_parse_multiple_offers():
     assert len(offers) == 3
     assert offers[0]['offer_id'] == 'FPO001'
     assert offers[1]['offer_id'] == 'FPO002'
-    assert offers[2]['offer_id'] == 'FPO003'
\ No newline at end of file
+    assert offers[2]['offer_id'] == 'FPO003'
+
+
+def test_parse_deeply_nested_structure():
+    """Test fallback search for OFFER_LIST items at an unknown path"""
+    data = {
+        "RESPONSE": {
+            "slots": [
+                {
+                    "widget": {
+                        "items": [
+                            {
+                                "type": "OFFER_LIST",
+                                "data": {
+                                    "offerList": [
+                                        {
+                                            "provider": ["KOTAK"],
+                                            "offerText": {"text": "Get ₹75 off"},
+                                            "offerDescription": {"id": "FPO006", "text": "Flat ₹75 off"}
+                                        }
+                                    ]
+                                }
+                            }
+                        ]
+                    }
+                }
+            ]
+        }
+    }
+    
+    offers = parse_offers_from_flipkart_response(data)
+    
+    assert len(offers) == 1
+    assert offers[0]['offer_id'] == 'FPO006'
+    assert offers[0]['bank_codes'] == ['KOTAK']